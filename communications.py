@@ -1,58 +1,144 @@
 import serial
-from serial.serialutil import SerialException, SerialTimeoutException
+from serial.serialutil import SerialException
+import os
+import select
+import struct
 import sys
-from time import sleep
+from time import sleep, monotonic
+
+from parser import split_packets, is_valid_packet
 
 
 class Communications:
+    MAX_PACKET_SIZE = 19  # header, length, up to 16 data bytes, checksum
 
     def _write_bytes(self, packet):
         if self.serial.is_open:
             self.serial.write(packet)
 
-    def _read_bytes(self):
-        if self.serial.in_waiting > 0:
-            bytes_read = self.serial.read(self.serial.in_waiting)
-            if self.DEBUG:
-                print(f'Read read {len(bytes_read)}')
-            return bytes_read
+    def _wait_for_data(self, timeout):
+        # Block until the port is readable instead of sleeping a fixed amount
+        if sys.platform == 'win32':
+            # select() only works on sockets on Windows, so poll in_waiting there
+            deadline = monotonic() + timeout
+            while self.serial.in_waiting == 0:
+                if monotonic() >= deadline:
+                    return False
+                sleep(.001)
+            return True
 
-    def start_monitor_loop(self, sleep_time=.5, packet_interval=.5):
-        while 1:
-            self._write_bytes(bytes(self.MONITOR_PACKET_ONE))
-            sleep(sleep_time)
-            self.parse_packet_response()
+        readable, _, _ = select.select([self.serial], [], [], timeout)
+        return bool(readable)
+
+    def _read_bytes(self, count=1, timeout=.5):
+        # Responses arrive in the order the queries were sent, each one is:
+        # header byte, data length byte, data, checksum byte.
+        # The returned packets are memoryviews into this instance's receive buffer,
+        # they are overwritten by the next call so copy them with bytes() to keep them.
+        size = count * self.MAX_PACKET_SIZE
+        rx_buf = getattr(self, '_rx_buf', None)
+        if rx_buf is None or len(rx_buf) < size:
+            rx_buf = self._rx_buf = bytearray(size)
+        view = memoryview(rx_buf)
+
+        filled = 0
+        start = 0
+        packets = []
+        readinto = self.serial.readinto
+        wait_for_data = self._wait_for_data
+        deadline = monotonic() + timeout
+        while len(packets) < count:
+            remaining = deadline - monotonic()
+            if filled >= size or remaining <= 0 or not wait_for_data(remaining):
+                break
+            # Fill the reused receive buffer rather than growing a new one every call
+            filled += readinto(view[filled:filled + (self.serial.in_waiting or 1)])
+            # Only frame the bytes after the last complete packet
+            new_packets, start = split_packets(view[:filled], start)
+            packets += new_packets
 
-            self._write_bytes(bytes(self.MONITOR_PACKET_TWO))
-            sleep(sleep_time)
-            self.parse_packet_response()
+        if self.DEBUG:
+            print(f'Read read {filled}')
+        # The packets are views into the receive buffer, drop any with a bad checksum
+        return [packet for packet in packets[:count] if is_valid_packet(packet)]
 
-            self._write_bytes(bytes(self.MONITOR_PACKET_THREE))
-            sleep(sleep_time)
-            self.parse_packet_response()
-            self.monitor.print_monitor_settings()
-            sleep(packet_interval)
+    def start_monitor_loop(self, response_timeout=.5, packet_interval=.5):
+        # Look up the methods used every cycle once, outside the loop
+        reset_input_buffer = self.serial.reset_input_buffer
+        write_bytes = self._write_bytes
+        read_bytes = self._read_bytes
+        parse_packet_response = self.parse_packet_response
+        print_monitor_settings = self.monitor.print_monitor_settings
+        _sleep = sleep
+        query = self.CMD_QUERY_MONITOR_ALL
+
+        while 1:
+            # Send all three queries in one burst and collect the replies together,
+            # paying for one serial turnaround per cycle instead of three.
+            reset_input_buffer()
+            # No flush() here, it would block until the burst drains at 19200 baud.
+            # Waiting for the replies already orders us after the write.
+            write_bytes(query)
+            for packet in read_bytes(3, response_timeout):
+                parse_packet_response(packet)
+
+            print_monitor_settings()
+            _sleep(packet_interval)
 
     def _open_serial_port(self, comport):
-        self.serial = serial.Serial()
-        self.serial.setPort(comport)
-        self.serial.baudrate = 19200
+        # Exclusive locking is only implemented by pyserial's posix backend
+        options = {} if sys.platform == 'win32' else {'exclusive': True}
         try:
-            self.serial.open()
-
-        except FileNotFoundError as e:
-            print(f"[!] Error Opening Serial Port: {e}")
+            # Handing the settings to the constructor configures and opens the port in one go
+            self.serial = serial.Serial(port=comport, baudrate=19200, timeout=.3, **options)
 
-        except SerialException as e:
+        except (FileNotFoundError, SerialException) as e:
             print(f"[!] Error Opening Serial Port: {e}")
             sys.exit()
 
         if not self.serial.is_open:
             print(f"Error opening serial {self.serial.port}.  Exiting....")
-        sys.exit()
+            sys.exit()
+
+        self._set_low_latency()
+
+    def _set_low_latency(self):
+        # USB serial adapters (FTDI etc.) buffer reads for up to 16ms by default.
+        # Setting ASYNC_LOW_LATENCY on the tty delivers bytes as soon as they arrive.
+        if not sys.platform.startswith('linux'):
+            return
+
+        import fcntl
+        TIOCGSERIAL = 0x541E
+        TIOCSSERIAL = 0x541F
+        ASYNC_LOW_LATENCY = 0x2000
+        FLAGS_OFFSET = 16  # type, line, port and irq ints precede flags in serial_struct
+
+        buf = bytearray(128)
+        try:
+            fcntl.ioctl(self.serial.fileno(), TIOCGSERIAL, buf)
+            flags, = struct.unpack_from('i', buf, FLAGS_OFFSET)
+            struct.pack_into('i', buf, FLAGS_OFFSET, flags | ASYNC_LOW_LATENCY)
+            fcntl.ioctl(self.serial.fileno(), TIOCSSERIAL, buf)
+        except OSError as e:
+            # Not every driver supports the serial ioctls, the port still works without it
+            if self.DEBUG:
+                print(f"[!] Unable to set low latency mode: {e}")
+
+        # FTDI adapters also have their own latency timer (in ms) exposed through sysfs
+        device = os.path.basename(os.path.realpath(self.serial.port))
+        latency_timer = f'/sys/bus/usb-serial/devices/{device}/latency_timer'
+        if os.path.exists(latency_timer):
+            try:
+                with open(latency_timer, 'w') as f:
+                    f.write('1')
+            except OSError as e:
+                # Writing the timer usually needs root or a udev rule
+                if self.DEBUG:
+                    print(f"[!] Unable to set FTDI latency timer: {e}")
 
     def query_motion_controller_monitor(self):
-        return [self.CMD_QUERY_MONITOR_ONE, self.CMD_QUERY_MONITOR_TWO, self.CMD_QUERY_MONITOR_THREE]
+        return self.CMD_QUERY_MONITOR_ONE, self.CMD_QUERY_MONITOR_TWO, self.CMD_QUERY_MONITOR_THREE
 
     @staticmethod
     def get_controller_serial_number(self):
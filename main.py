@@ -1,11 +1,5 @@
-import serial
-import os, sys
-from enum import Enum
-
 from kelly_controller import KellyController
 #from parser import Monitor
-from time import sleep
-from blessed import terminal
 
 
 
@@ -1,49 +1,96 @@
-from typing import Optional
-import math
-from enum import Enum
-from time import sleep
-from typing import List, ByteString
+import struct
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple, Union
 
-TIRE_SIZE = 12  # in inches
+# Packets reach the parser as bytes or as memoryview slices of the receive buffer
+Packet = Union[bytes, bytearray, memoryview]
 
+# Monitor packet one carries 16 single byte fields starting after the header and length bytes
+MONITOR_ONE_FORMAT = struct.Struct('16B')
+# Monitor packet two: motor speed at byte 5 and phase current at byte 7 of the packet
+MONITOR_TWO_FORMAT = struct.Struct('BxB')
 
-class PacketType(Enum):
+
+def split_packets(buff: Packet, start: int = 0) -> Tuple[List[memoryview], int]:
+    # Walk back to back packets (header byte, data length byte, data, checksum byte)
+    # from offset start and return a view of each complete one, along with the offset
+    # where the next, still partial, packet begins so a caller can resume from there
+    view = memoryview(buff)
+    packets = []
+    while len(view) - start >= 2:
+        end = start + view[start + 1] + 3
+        if end > len(view):
+            break
+        packets.append(view[start:end])
+        start = end
+    return packets, start
+
+
+def is_valid_packet(pkt: Packet) -> bool:
+    # Cheap length checks first, the checksum (sum of all other bytes truncated
+    # to 8 bits) is only worked out for packets that are the right shape
+    if len(pkt) < 3 or len(pkt) != pkt[1] + 3:
+        return False
+    # Sum through a memoryview so a bytes packet isn't copied by the slice
+    return sum(memoryview(pkt)[:-1]) & 0xFF == pkt[-1]
+
+
+class PacketType(IntEnum):
     RESPONSE_MONITOR_ONE = 0x3A
     RESPONSE_MONITOR_TWO = 0x3B
     RESPONSE_MONITOR_THREE = 0x3C
 
 
 class Parser:
-    CMD_QUERY_MONITOR_ONE = [0x3A, 0x00, 0x3A]
-    CMD_QUERY_MONITOR_TWO = [0x3B, 0x00, 0x3B]
-    CMD_QUERY_MONITOR_THREE = [0x3C, 0x00, 0x3C]
+    # Query packets carry no data, so they are fixed and built once as bytes
+    CMD_QUERY_MONITOR_ONE = bytes((0x3A, 0x00, 0x3A))
+    CMD_QUERY_MONITOR_TWO = bytes((0x3B, 0x00, 0x3B))
+    CMD_QUERY_MONITOR_THREE = bytes((0x3C, 0x00, 0x3C))
+    CMD_QUERY_MONITOR_ALL = CMD_QUERY_MONITOR_ONE + CMD_QUERY_MONITOR_TWO + CMD_QUERY_MONITOR_THREE
+
+    # Supplied by the class Parser is mixed into
+    DEBUG: bool
+    monitor: 'Parser'
 
-    def __init_(self):
+    # Values decoded from the monitor packets
+    tps_pedal: Optional[int]
+    brake_pedal: Optional[int]
+    brake_sw1: Optional[int]
+    foot_sw: Optional[int]
+    forward_sw: Optional[int]
+    reverse_sw: Optional[int]
+    hall_a: Optional[int]
+    hall_b: Optional[int]
+    hall_c: Optional[int]
+    battery_voltage: Optional[int]
+    motor_temp: Optional[int]
+    controller_temp: Optional[int]
+    setting_dir: Optional[int]
+    actual_dir: Optional[int]
+    brake_sw2: Optional[int]
+    low_speed: Optional[int]
+    motor_speed: Optional[int]
+    phase_current: Optional[int]
+
+    def parse_packet_monitor_one(self, pkt: Packet) -> None:
+        if len(pkt) < 2 + MONITOR_ONE_FORMAT.size:
+            return
+        (self.tps_pedal, self.brake_pedal, self.brake_sw1, self.foot_sw,
+         self.forward_sw, self.reverse_sw, self.hall_a, self.hall_b,
+         self.hall_c, self.battery_voltage, self.motor_temp, self.controller_temp,
+         self.setting_dir, self.actual_dir, self.brake_sw2, self.low_speed) = MONITOR_ONE_FORMAT.unpack_from(pkt, 2)
+
+    def parse_packet_monitor_two(self, pkt: Packet) -> None:
+        if len(pkt) < 5 + MONITOR_TWO_FORMAT.size:
+            return
+        # motor_speed is actually motor RPMs
+        self.motor_speed, self.phase_current = MONITOR_TWO_FORMAT.unpack_from(pkt, 5)
+
+    def parse_packet_monitor_three(self, pkt: Packet) -> None:
+        # Nothing is decoded from the third monitor packet yet
         pass
 
-    def parse_packet_monitor_one(self, pkt):
-        self.tps_pedal = pkt[2]
-        self.brake_pedal = pkt[3]
-        self.brake_sw1 = pkt[4]
-        self.foot_sw = pkt[5]
-        self.forward_sw = pkt[6]
-        self.reverse_sw = pkt[7]
-        self.hall_a = pkt[8]
-        self.hall_b = pkt[9]
-        self.hall_c = pkt[10]
-        self.battery_voltage = pkt[11]
-        self.motor_temp = pkt[12]
-        self.controller_temp = pkt[13]
-        self.setting_dir = pkt[14]
-        self.actual_dir = pkt[15]
-        self.brake_sw2 = pkt[16]
-        self.low_speed = pkt[17]
-
-    def parse_packet_monitor_two(self, pkt):
-        self.motor_speed = pkt[5]  # This is actually motor RPMs
-        self.phase_current = pkt[7]
-
-    def __init__(self):
+    def __init__(self) -> None:
         self.low_speed = None
         self.brake_sw2 = None
         self.actual_dir = None
@@ -61,19 +108,33 @@ class Parser:
         self.brake_pedal = None
         self.tps_pedal = None
 
-    def parse_packet_response(self, buff: List[ByteString]):
-        header_byte = buff[0]
-
-        match header_byte:
-            case PacketType.RESPONSE_MONITOR_ONE.value:
-                self.monitor.parse_packet_monitor_one(buff)
-                if self.DEBUG:
-                    print(f"[+]Got Monitor Packet Response One.  Size:{len(buff)} byte/s ")
-            case PacketType.RESPONSE_MONITOR_TWO.value:
-                if self.DEBUG:
-                    print(f"[+]Got Monitor Packet Response Two.  Size:{len(buff)} byte/s ")
-                self.monitor.parse_packet_monitor_two(buff)
-
-            case PacketType.RESPONSE_MONITOR_THREE.value:
-                if self.DEBUG:
-                    print(f"[+]Got Monitor Packet Response Three.  Size:{len(buff)} byte/s ")
+    # Response header byte -> (name of the monitor's parse method, name used for debug output)
+    _RESPONSE_HANDLERS: Dict[int, Tuple[str, str]] = {
+        PacketType.RESPONSE_MONITOR_ONE: ('parse_packet_monitor_one', "One"),
+        PacketType.RESPONSE_MONITOR_TWO: ('parse_packet_monitor_two', "Two"),
+        PacketType.RESPONSE_MONITOR_THREE: ('parse_packet_monitor_three', "Three"),
+    }
+
+    def parse_packet_response(self, buff: Packet) -> None:
+        handler = self._RESPONSE_HANDLERS.get(buff[0])
+        if handler is None:
+            return
+
+        method, name = handler
+        if __debug__ and self.DEBUG:
+            print(f"[+]Got Monitor Packet Response {name}.  Size:{len(buff)} byte/s ")
+        getattr(self.monitor, method)(buff)
+
+    def parse_packet_stream(self, buff: Packet) -> None:
+        # Parse a run of back to back responses, e.g. when replaying a captured serial log:
+        #     controller.parse_packet_stream(open('capture.bin', 'rb').read())
+        view = memoryview(buff)
+        start = 0
+        while len(view) - start >= 3:
+            end = start + view[start + 1] + 3
+            if end <= len(view) and is_valid_packet(view[start:end]):
+                self.parse_packet_response(view[start:end])
+                start = end
+            else:
+                # Corrupt length byte or checksum, slide forward one byte and re-frame from there
+                start += 1